@@ -1,31 +1,96 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-from geopy.geocoders import ArcGIS
-from geopy.distance import geodesic
+from geopy.geocoders import GoogleV3
+from geopy.adapters import AioHTTPAdapter
+from geopy.extra.rate_limiter import AsyncRateLimiter
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import os
+import requests
+import sqlite3
 import io
+import json
 import pydeck as pdk
 import time
 import re
 
+# Updated: Made 'CORNER' much stricter so it doesn't block "Peachtree Corners"
+# _VAGUE_TERMS is the single source of truth: the regex (per-row fallback and
+# vectorized mask), the Aho-Corasick automaton, and the Numba kernel are all
+# derived from it, and each scans the address in one pass.
+_VAGUE_TERMS = (
+    'INTERSEC', 'CORNER OF', 'NORTH OF', 'SOUTH OF', 'EAST OF', 'WEST OF',
+    '1 MI', '2 MI', '3 MI', 'MILE', 'NEAR ', 'ADJACENT', 'BEHIND ', 'VICINITY',
+    'APPROX '
+)
+_VAGUE_RE = re.compile('|'.join(map(re.escape, _VAGUE_TERMS)))
+_HAS_DIGIT_RE = re.compile(r'\d')
+
+# Optional: when pyahocorasick is installed, scan for all vague terms in one
+# automaton pass. Same O(len(addr)) as the regex alternation today, but it
+# stays flat if the term list ever grows to hundreds of patterns.
+try:
+    import ahocorasick
+    _VAGUE_AUTOMATON = ahocorasick.Automaton()
+    for _term in _VAGUE_TERMS:
+        _VAGUE_AUTOMATON.add_word(_term, _term)
+    _VAGUE_AUTOMATON.make_automaton()
+except ImportError:
+    _VAGUE_AUTOMATON = None
+
+def _contains_vague_term(addr):
+    """True if any vague term occurs in addr (single pass over the string)."""
+    if _VAGUE_AUTOMATON is not None:
+        for _ in _VAGUE_AUTOMATON.iter(addr):
+            return True
+        return False
+    return _VAGUE_RE.search(addr) is not None
+
+# Optional: JIT-compile the per-row classifier when Numba is installed.
+# The DataFrame path stays on the vectorized regex mask (already a C-level
+# single pass, faster for whole columns); the compiled kernel only helps
+# callers driving this helper one record at a time.
+try:
+    from numba import njit as _njit
+except ImportError:
+    _njit = None
+
+if _njit is not None:
+    @_njit(cache=True)
+    def _is_vague_compiled(addr):
+        for term in _VAGUE_TERMS:
+            if term in addr:
+                return True
+        if len(addr) == 0:
+            return True
+        sp = addr.find(' ')
+        first_word = addr[:sp] if sp != -1 else addr
+        for ch in first_word:
+            if '0' <= ch <= '9':
+                return False
+        return first_word != 'HWY' and first_word != 'US' and first_word != 'I-'
+else:
+    _is_vague_compiled = None
+
 def is_vague_address(addr):
     addr = str(addr).upper().strip()
-    
-    # Updated: Made 'CORNER' much stricter so it doesn't block "Peachtree Corners"
-    vague_terms = [
-        'INTERSEC', 'CORNER OF', 'NORTH OF', 'SOUTH OF', 'EAST OF', 'WEST OF',
-        '1 MI', '2 MI', '3 MI', 'MILE', 'NEAR ', 'ADJACENT', 'BEHIND ', 'VICINITY', 
-        'APPROX '
-    ]
-    if any(term in addr for term in vague_terms): return True
-    
+
+    if _is_vague_compiled is not None:
+        return _is_vague_compiled(addr)
+
+    if _contains_vague_term(addr): return True
+
     # Make sure we don't crash if the address is empty
     if not addr: return True
-        
-    first_word = addr.split(' ')[0]
+
+    first_word = addr.split(' ', 1)[0]
     # Allow letters in the first word if it's a highway (like "HWY" or "US")
-    if not any(char.isdigit() for char in first_word) and first_word not in ['HWY', 'US', 'I-']: 
+    if not _HAS_DIGIT_RE.search(first_word) and first_word not in ['HWY', 'US', 'I-']:
         return True
-        
+
     return False
 
 def clean_string(val):
@@ -35,6 +100,50 @@ def clean_string(val):
     if clean_val.endswith('.0'): clean_val = clean_val[:-2]
     return " ".join(clean_val.split())
 
+# Accepted header spellings for each address component (headers are already
+# normalized to lowercase_with_underscores by the loader). Resolved once per
+# run — never per row.
+CITY_COLS = ('city', 'site_city')
+STATE_COLS = ('state', 'st', 'site_state')
+ZIP_COLS = ('zip', 'zip_code', 'zipcode', 'site_zip')
+
+def _first_col(columns, candidates):
+    """Return the first candidate present in the DataFrame's columns, else None."""
+    return next((c for c in candidates if c in columns), None)
+
+EARTH_RADIUS_MILES = 3958.7613
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance in miles, vectorized over numpy arrays.
+
+    The spherical approximation is within ~0.5% of a full geodesic, which
+    is plenty for a 0.1-2 mile radius filter.
+    """
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = np.radians(np.asarray(lon2) - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+def clean_series(s):
+    """Vectorized clean_string, paid once per unique value.
+
+    City/state/zip columns repeat a handful of distinct values thousands of
+    times, so the string work runs on the factorized uniques and the results
+    are broadcast back to every row through the codes. Nulls (code -1)
+    become "" like clean_string.
+    """
+    codes, uniques = pd.factorize(s)
+    u = pd.Series(uniques)
+    out = u.astype(str).str.strip()
+    out = out.mask(out.str.lower() == 'nan', "")
+    out = out.str.replace(r'\.0$', '', regex=True)
+    cleaned = out.str.split().str.join(' ').to_numpy(dtype=object)
+    if not len(cleaned):
+        return pd.Series("", index=s.index, dtype=object)
+    result = np.where(codes >= 0, cleaned[np.clip(codes, 0, None)], "")
+    return pd.Series(result, index=s.index)
+
 def scrub_address_for_arcgis(addr):
     """Aggressively cleans addresses so ArcGIS doesn't choke on them."""
     addr = addr.upper()
@@ -51,13 +160,195 @@ def scrub_address_for_arcgis(addr):
     
     return " ".join(addr.split())
 
+# --- FILE LOADING ---
+# Prefer the Rust-backed calamine engine for Excel (3-10x faster than
+# openpyxl's XML traversal) and pyarrow's multi-threaded CSV parser, but
+# fall back to the pandas defaults when they are not installed.
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+CSV_ENGINE = 'pyarrow' if HAS_PYARROW else None
+
+def read_upload(f):
+    """Read one uploaded CSV/Excel file with the fastest available parser.
+
+    With pyarrow installed, columns come back Arrow-backed: strings live in
+    one contiguous buffer instead of a Python object per cell, roughly
+    halving memory and feeding the C string kernels directly.
+    """
+    kwargs = {'dtype_backend': 'pyarrow'} if HAS_PYARROW else {}
+    if f.name.endswith('.csv'):
+        if CSV_ENGINE:
+            kwargs['engine'] = CSV_ENGINE
+        return pd.read_csv(f, **kwargs)
+    if EXCEL_ENGINE:
+        kwargs['engine'] = EXCEL_ENGINE
+    return pd.read_excel(f, **kwargs)
+
+# --- GEOCODE CACHE ---
+# Repeated addresses (same site across multiple ESA files, or re-runs after
+# tweaking the radius) should never hit the network twice. Results persist
+# in a SQLite file across sessions: the key column is the primary key, so
+# lookups stay O(log N) even with millions of cached addresses. Failed
+# lookups are cached too and retried after a week.
+LEGACY_CACHE_FILE = "geocode_cache.json"
+CACHE_DB = "geocode_cache.sqlite"
+NEGATIVE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_COMMIT_EVERY = 100
+
+def open_geocode_cache():
+    conn = sqlite3.connect(CACHE_DB)
+    conn.execute('CREATE TABLE IF NOT EXISTS geocode('
+                 'key TEXT PRIMARY KEY, ok INTEGER, '
+                 'lat REAL, lon REAL, addr TEXT, ts INTEGER)')
+    # One-time import of the old JSON cache, if one is lying around
+    try:
+        with open(LEGACY_CACHE_FILE) as f:
+            legacy = json.load(f)
+        conn.executemany(
+            'INSERT OR IGNORE INTO geocode VALUES(?,?,?,?,?,?)',
+            [(k, int(e.get('ok', False)), e.get('lat'), e.get('lon'),
+              e.get('addr'), e.get('ts', 0)) for k, e in legacy.items()])
+        conn.commit()
+        os.remove(LEGACY_CACHE_FILE)
+    except Exception:
+        pass  # a broken disk cache should never kill the analysis
+    return conn
+
+def cache_lookup_many(conn, keys):
+    """Probe the cache for many keys with chunked SELECT ... IN queries.
+
+    One round-trip per ~500 keys instead of one per key — a vectorized
+    cache probe. Returns {key: entry_dict} for the keys that were found.
+    """
+    found = {}
+    chunk_size = 500  # stay under SQLite's bound-parameter limit
+    for k in range(0, len(keys), chunk_size):
+        chunk = keys[k:k + chunk_size]
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f'SELECT key, ok, lat, lon, addr, ts FROM geocode WHERE key IN ({placeholders})',
+            chunk)
+        for key, ok, lat, lon, addr, ts in rows:
+            found[key] = {'ok': bool(ok), 'lat': lat, 'lon': lon, 'addr': addr, 'ts': ts}
+    return found
+
+def cache_store(conn, key, entry):
+    """Write-through one geocode result (positive or negative)."""
+    conn.execute('INSERT OR REPLACE INTO geocode VALUES(?,?,?,?,?,?)',
+                 (key, int(entry['ok']), entry.get('lat'), entry.get('lon'),
+                  entry.get('addr'), entry['ts']))
+
+# --- BATCHED ARCGIS GEOCODING ---
+# ArcGIS's own guidance is that fewer, larger batches beat many single
+# requests, so cache misses go straight to the REST geocodeAddresses
+# endpoint in chunks of up to 1000, with ~4 batches in flight at a time.
+ARCGIS_BATCH_URL = ("https://geocode.arcgis.com/arcgis/rest/services"
+                    "/World/GeocodeServer/geocodeAddresses")
+ARCGIS_BATCH_SIZE = 1000
+ARCGIS_BATCH_WORKERS = 4
+
+def _make_session():
+    """requests.Session with keep-alive and retry/backoff on 429s and 5xx."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=None)
+    session.mount('https://', HTTPAdapter(max_retries=retry))
+    return session
+
+def _geocode_batch_arcgis(session, batch, token):
+    """Geocode one chunk of (position, key) tasks in a single HTTP request.
+
+    geocodeAddresses is the credit-consuming batch API and requires an
+    authenticated token. Returns (position, key, result, err) tuples like
+    the Google path, where result is (lat, lon, address) or None for an
+    unmatched address. Batch-level failures (HTTP errors, a top-level
+    'error' in the response such as 'Token Required') raise — they are the
+    whole run's problem, not per-address not-founds.
+    """
+    payload = {
+        "records": [{"attributes": {"OBJECTID": i, "SingleLine": key}}
+                    for i, key in batch]
+    }
+    resp = session.post(
+        ARCGIS_BATCH_URL,
+        data={'addresses': json.dumps(payload), 'f': 'json', 'outSR': 4326,
+              'token': token},
+        timeout=60,
+    )
+    resp.raise_for_status()
+    body = resp.json()
+    if 'error' in body:
+        raise RuntimeError(body['error'].get('message', 'ArcGIS batch geocode failed'))
+
+    found = {}
+    for loc in body.get('locations', []):
+        oid = loc['attributes'].get('ResultID', loc['attributes'].get('OBJECTID'))
+        if loc.get('location') and loc['attributes'].get('Status') != 'U':
+            found[oid] = (loc['location']['y'], loc['location']['x'], loc.get('address'))
+
+    return [(i, key, found.get(i), None) for i, key in batch]
+
+async def _geocode_tasks_google(tasks, api_key, progress=None):
+    """Resolve all (position, key) tasks on one aiohttp session.
+
+    Google has no batch endpoint, so the win is scheduling every request on
+    the event loop behind a shared AsyncRateLimiter (which also handles
+    backoff/retries). Returns the same (i, key, result, err) tuples as the
+    batched ArcGIS path. `progress(done, total)` is invoked at ~1%
+    increments from this single consumer — never once per request, which
+    would mean a websocket frame per geocode.
+    """
+    async with GoogleV3(api_key=api_key, adapter_factory=AioHTTPAdapter) as geolocator:
+        rate_limited = AsyncRateLimiter(
+            geolocator.geocode,
+            min_delay_seconds=0.02, max_retries=2,
+            error_wait_seconds=1.0, swallow_exceptions=False
+        )
+
+        async def one(task):
+            i, key = task
+            try:
+                loc = await rate_limited(key, timeout=10)
+                result = None if loc is None else (loc.latitude, loc.longitude, loc.address)
+                return i, key, result, None
+            except Exception as e:
+                return i, key, None, str(e)
+
+        outcomes = []
+        step = max(1, len(tasks) // 100)
+        for fut in asyncio.as_completed([one(t) for t in tasks]):
+            outcomes.append(await fut)
+            done = len(outcomes)
+            if progress and (done % step == 0 or done == len(tasks)):
+                progress(done, len(tasks))
+        return outcomes
+
 st.set_page_config(page_title="GIS Phase I ESA Agent", layout="wide", page_icon="📍")
 
 # --- 1. SIDEBAR INPUTS ---
 with st.sidebar:
     st.header("⚙️ Project Settings")
-    st.success("✅ Free ArcGIS Engine (With Smart Scrubber)")
-    
+    engine = st.selectbox("Geocoding Engine", ["ArcGIS", "Google"])
+    use_google = engine.startswith("Google")
+    if use_google:
+        google_api_key = st.text_input("Google API Key", type="password")
+        arcgis_token = ""
+    else:
+        google_api_key = ""
+        arcgis_token = st.text_input("ArcGIS API Key / Token", type="password")
+        st.caption("Batch geocoding uses the geocodeAddresses API, "
+                   "which consumes credits and requires a token.")
+
     st.divider()
     st.subheader("📍 Target Property")
     site_lat = st.number_input("Site Latitude", format="%.6f", value=28.349200)
@@ -79,103 +370,210 @@ uploaded_files = st.file_uploader("📂 Drop ESA Files Here (Excel/CSV)", type=[
 # --- 2. MAIN ANALYSIS ENGINE ---
 if uploaded_files:
     if st.button("🚀 Run Analysis"):
-        geolocator = ArcGIS()
-        site_coords = (site_lat, site_lon)
+        if use_google and not google_api_key:
+            st.error("Google geocoding requires an API key.")
+            st.stop()
+        if not use_google and not arcgis_token:
+            st.error("ArcGIS batch geocoding requires an API key / token.")
+            st.stop()
+
+        cache_conn = open_geocode_cache()
 
         all_data = []
         for f in uploaded_files:
             try:
-                if f.name.endswith('.csv'): df = pd.read_csv(f)
-                else: df = pd.read_excel(f)
-                df.columns = df.columns.str.strip().str.lower()
-                
-                addr_cols = [c for c in df.columns if 'address' in c or 'site_address' in c]
-                if addr_cols:
-                    df.rename(columns={addr_cols[0]: 'address'}, inplace=True)
+                df = read_upload(f)
+                # Normalize headers per file (O(#columns), negligible) so
+                # e.g. "City" and "city " from different uploads align into
+                # one column at concat instead of duplicating.
+                df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
+                addr_col = next((c for c in df.columns if 'address' in str(c)), None)
+                if addr_col is not None:
+                    df = df.rename(columns={addr_col: 'address'})
                     all_data.append(df)
             except Exception as e:
                 st.error(f"Could not read {f.name}: {e}")
 
         if all_data:
             master_df = pd.concat(all_data, ignore_index=True)
-            matches, oob, ngcs = [], [], []
-            
+
+            # --- VECTORIZED ORPHAN FILTER ---
+            # Classify the whole column at once so only mappable rows hit the
+            # (slow) geocoding stage. Same rules as is_vague_address, but run
+            # as pandas string ops instead of once per row.
+            master_df['address'] = clean_series(master_df['address'])
+            addr_upper = master_df['address'].str.upper().str.strip()
+
+            vague_mask = addr_upper.str.contains(_VAGUE_RE, na=False)
+            first_word = addr_upper.str.split(n=1).str[0]
+            no_number_mask = (
+                ~first_word.str.contains(_HAS_DIGIT_RE, na=False)
+                & ~first_word.isin(['HWY', 'US', 'I-'])
+            )
+            is_orphan = vague_mask | no_number_mask | (addr_upper == "")
+
+            master_df.loc[is_orphan, 'status'] = "NGC (Orphan)"
+            master_df.loc[is_orphan, 'reason'] = "Vague Description / Intersection"
+            orphan_df = master_df[is_orphan]
+
+            geo_df = master_df[~is_orphan]
+
             prog_bar = st.progress(0)
             status_text = st.empty()
-            total_rows = len(master_df)
-
-            for i, (index, row) in enumerate(master_df.iterrows()):
-                prog_bar.progress((i + 1) / total_rows)
-                status_text.text(f"Processing Record {i+1} of {total_rows}...")
-                
-                raw_addr = row.get('address', '')
-                addr = clean_string(raw_addr)
-                
-                if is_vague_address(addr):
-                    row['status'] = "NGC (Orphan)"
-                    row['reason'] = "Vague Description / Intersection"
-                    ngcs.append(row)
-                    continue 
-
-                # SCRUB THE ADDRESS FOR ARCGIS
-                scrubbed_addr = scrub_address_for_arcgis(addr)
-                
-                # BUILD FULL ADDRESS
-                full_search_address = scrubbed_addr
-                
-                if force_state:
-                    full_search_address += f", {force_state}"
+
+            # PHASE 1: build the full search address for every mappable row
+            # (all column-level string ops; no per-row Python concatenation)
+            scrubbed = geo_df['address'].map(scrub_address_for_arcgis)
+
+            city_col = _first_col(geo_df.columns, CITY_COLS)
+            state_col = _first_col(geo_df.columns, STATE_COLS)
+            zip_col = _first_col(geo_df.columns, ZIP_COLS)
+
+            if force_state:
+                full_search = scrubbed + f", {force_state}"
+            else:
+                def _component(col, sep):
+                    if col is None:
+                        return pd.Series("", index=geo_df.index)
+                    part = clean_series(geo_df[col])
+                    return (sep + part).where(part != "", "")
+
+                full_search = scrubbed.str.cat(
+                    [_component(city_col, ', '),
+                     _component(state_col, ', '),
+                     _component(zip_col, ' ')],
+                    na_rep=''
+                )
+
+            cache_keys = full_search.str.strip().str.upper().tolist()
+
+            # PHASE 2: geocode unique addresses only. ESA uploads repeat the
+            # same address constantly (multi-tenant sites, branches), so the
+            # cache probe and the network work both run per unique key and
+            # get mapped back to rows afterwards.
+            provider = 'google' if use_google else 'arcgis'
+            unique_keys = list(dict.fromkeys(cache_keys))
+            cache_hits = cache_lookup_many(cache_conn, [f"{provider}|{k}" for k in unique_keys])
+            resolved = {}   # key -> ((lat, lon, addr) or None, err or None)
+            misses = []
+            for key in unique_keys:
+                hit = cache_hits.get(f"{provider}|{key}")
+                if hit is not None and not hit['ok'] and time.time() - hit['ts'] > NEGATIVE_TTL_SECONDS:
+                    hit = None  # stale negative result, worth retrying
+                if hit is not None:
+                    resolved[key] = ((hit['lat'], hit['lon'], hit['addr']) if hit['ok'] else None, None)
                 else:
-                    city = next((clean_string(row[c]) for c in row.index if c in ['city', 'site city', 'site_city']), "")
-                    state = next((clean_string(row[c]) for c in row.index if c in ['state', 'st', 'site state']), "")
-                    zip_code = next((clean_string(row[c]) for c in row.index if 'zip' in c), "")
-                    
-                    if city: full_search_address += f", {city}"
-                    if state: full_search_address += f", {state}"
-                    if zip_code: full_search_address += f" {zip_code}"
+                    misses.append(key)
 
-                # GEOCODING
-                try:
-                    loc = geolocator.geocode(full_search_address, timeout=10)
-                    
-                    if loc:
-                        found_coords = (loc.latitude, loc.longitude)
-                        dist = geodesic(site_coords, found_coords).miles
-                        
-                        row['mapped_lat'] = loc.latitude
-                        row['mapped_lon'] = loc.longitude
-                        row['miles_from_site'] = round(dist, 3)
-                        row['arcgis_address'] = loc.address
-                        row['search_string_used'] = full_search_address
-                        
-                        if dist <= search_radius:
-                            row['status'] = "Match"
-                            matches.append(row)
-                        else:
-                            row['status'] = "Out of Bounds"
-                            oob.append(row)
+            if misses:
+                tasks = list(enumerate(misses))
+                if use_google:
+                    def _report(done, total):
+                        prog_bar.progress(done / total)
+                        status_text.text(f"Geocoded {done} of {total} unique addresses...")
+
+                    outcomes = asyncio.run(_geocode_tasks_google(tasks, google_api_key, _report))
+                else:
+                    outcomes = []
+                    session = _make_session()
+                    batches = [tasks[k:k + ARCGIS_BATCH_SIZE]
+                               for k in range(0, len(tasks), ARCGIS_BATCH_SIZE)]
+                    try:
+                        with ThreadPoolExecutor(max_workers=ARCGIS_BATCH_WORKERS) as pool:
+                            for batch_outcomes in pool.map(
+                                    lambda b: _geocode_batch_arcgis(session, b, arcgis_token),
+                                    batches):
+                                outcomes.extend(batch_outcomes)
+                                prog_bar.progress(len(outcomes) / len(tasks))
+                                status_text.text(f"Geocoded {len(outcomes)} of {len(tasks)} unique addresses...")
+                    except Exception as e:
+                        st.error(f"ArcGIS batch geocoding failed: {e}")
+                        st.stop()
+
+                for n, (_, key, result, err) in enumerate(outcomes):
+                    if err is None:
+                        entry = {'ok': result is not None, 'ts': int(time.time())}
+                        if result:
+                            entry.update(lat=result[0], lon=result[1], addr=result[2])
+                        cache_store(cache_conn, f"{provider}|{key}", entry)
+                        resolved[key] = (result, None)
                     else:
-                        row['status'] = "NGC (Not Found)"
-                        row['reason'] = "Address not found by ArcGIS"
-                        ngcs.append(row)
-                        
-                except Exception as e:
-                    row['status'] = "Error"
-                    row['reason'] = str(e)
-                    ngcs.append(row)
-                
-                time.sleep(0.1)
+                        # Transport/auth errors are NOT cached: only genuine
+                        # not-found responses earn a negative entry. A
+                        # transient outage or bad API key must not turn into
+                        # a week of "Not Found" on the next run.
+                        resolved[key] = (None, err)
+                    if n % CACHE_COMMIT_EVERY == 0:
+                        cache_conn.commit()
+
+            # Map unique-key results back onto the per-row arrays
+            results = [None] * len(geo_df)    # (lat, lon, addr) or None
+            errors = {}                       # position -> error message
+            for i, key in enumerate(cache_keys):
+                result, err = resolved[key]
+                if err is not None:
+                    errors[i] = err
+                else:
+                    results[i] = result
+
+            # PHASE 3: classify every row against the target property.
+            # Outputs are written into flat positional arrays and attached to
+            # geo_df in one assign() — no per-row Series/dict mutation.
+            n = len(geo_df)
+            status = np.empty(n, dtype=object)
+            reason = np.empty(n, dtype=object)
+            mapped_lat = np.full(n, np.nan)
+            mapped_lon = np.full(n, np.nan)
+            miles_from_site = np.full(n, np.nan)
+            geocoder_addr = np.empty(n, dtype=object)
+
+            for i in range(n):
+                if i in errors:
+                    status[i] = "Error"
+                    reason[i] = errors[i]
+                    continue
+
+                result = results[i]
+                if result:
+                    mapped_lat[i], mapped_lon[i], geocoder_addr[i] = result
+                else:
+                    status[i] = "NGC (Not Found)"
+                    reason[i] = f"Address not found by {'Google' if use_google else 'ArcGIS'}"
+
+            # One vectorized haversine pass replaces a geodesic call per row
+            has_coords = ~np.isnan(mapped_lat)
+            if has_coords.any():
+                dist = haversine_miles(site_lat, site_lon, mapped_lat[has_coords], mapped_lon[has_coords])
+                miles_from_site[has_coords] = np.round(dist, 3)
+                status[has_coords] = np.where(dist <= search_radius, "Match", "Out of Bounds")
+
+            geo_df = geo_df.assign(
+                # status takes <=4 distinct values: dictionary-encode it
+                status=pd.Categorical(status),
+                reason=reason,
+                mapped_lat=mapped_lat, mapped_lon=mapped_lon,
+                miles_from_site=miles_from_site,
+                arcgis_address=geocoder_addr,
+                search_string_used=cache_keys,
+            )
+            matches_df = geo_df[geo_df.status == "Match"]
+            oob_df = geo_df[geo_df.status == "Out of Bounds"]
+            failed_df = geo_df[geo_df.status.isin(["NGC (Not Found)", "Error"])]
 
             prog_bar.empty()
             status_text.empty()
+            cache_conn.commit()
+            cache_conn.close()
 
             # --- 3. RESULTS DISPLAY ---
             st.divider()
             
+            all_ngcs = pd.concat([orphan_df, failed_df], ignore_index=True) if len(failed_df) else orphan_df
+
             c1, c2, c3 = st.columns(3)
-            c1.metric("✅ Matches (Within Radius)", len(matches))
-            c2.metric("⚠️ Out of Bounds", len(oob))
-            c3.metric("❌ Orphans (NGCs)", len(ngcs))
+            c1.metric("✅ Matches (Within Radius)", len(matches_df))
+            c2.metric("⚠️ Out of Bounds", len(oob_df))
+            c3.metric("❌ Orphans (NGCs)", len(all_ngcs))
 
             # --- 4. MAP ---
             layers = []
@@ -189,23 +587,31 @@ if uploaded_files:
                 pickable=False
             ))
             
-            if matches:
-                layers.append(pdk.Layer(
-                    'ScatterplotLayer',
-                    data=pd.DataFrame(matches),
-                    get_position='[mapped_lon, mapped_lat]',
-                    get_color='[0, 200, 0, 200]', 
-                    get_radius=80,
-                    pickable=True
-                ))
-            
-            if show_oob and oob:
+            # One typed frame for all plotted sites: float32 coordinates keep
+            # the JSON payload to the browser small, and color/radius are
+            # precomputed columns so a single layer covers both statuses.
+            plot_statuses = ["Match", "Out of Bounds"] if show_oob else ["Match"]
+            plot_df = geo_df.loc[
+                geo_df.status.isin(plot_statuses),
+                ['mapped_lon', 'mapped_lat', 'status', 'address', 'miles_from_site']
+            ].copy()
+            plot_df[['mapped_lon', 'mapped_lat']] = plot_df[['mapped_lon', 'mapped_lat']].astype('float32')
+
+            is_match = (plot_df.status == "Match").to_numpy()
+            plot_df['color'] = np.where(
+                is_match[:, None],
+                np.array([0, 200, 0, 200]),
+                np.array([0, 100, 255, 150]),
+            ).tolist()
+            plot_df['radius'] = np.where(is_match, 80, 60)
+
+            if len(plot_df):
                 layers.append(pdk.Layer(
                     'ScatterplotLayer',
-                    data=pd.DataFrame(oob),
+                    data=plot_df,
                     get_position='[mapped_lon, mapped_lat]',
-                    get_color='[0, 100, 255, 150]', 
-                    get_radius=60,
+                    get_color='color',
+                    get_radius='radius',
                     pickable=True
                 ))
 
@@ -221,11 +627,11 @@ if uploaded_files:
             ))
 
             # --- 5. NGC TABLE ---
-            if ngcs:
+            if len(all_ngcs):
                 st.subheader("❌ Orphan (NGC) List")
                 st.warning("The following sites were identified as Orphans (Vague or Unmappable).")
-                
-                df_ngc = pd.DataFrame(ngcs)
+
+                df_ngc = all_ngcs
                 display_cols = ['address', 'reason']
                 for col in ['site id', 'site_id', 'city', 'state', 'st', 'zip', 'zipcode']:
                     if col in df_ngc.columns: display_cols.insert(-2, col)
@@ -234,10 +640,24 @@ if uploaded_files:
 
             # --- 6. EXPORT ---
             output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                if matches: pd.DataFrame(matches).to_excel(writer, sheet_name="Matches", index=False)
-                if oob: pd.DataFrame(oob).to_excel(writer, sheet_name="Out_of_Bounds", index=False)
-                if ngcs: pd.DataFrame(ngcs).to_excel(writer, sheet_name="Orphans_NGC", index=False)
+            # Note: xlsxwriter's constant_memory mode cannot be used here.
+            # to_excel emits cells column-by-column, while constant_memory
+            # flushes rows as soon as a later row is touched and silently
+            # drops writes to flushed rows — every column but the first
+            # comes out blank.
+            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+                if len(matches_df): matches_df.to_excel(writer, sheet_name="Matches", index=False)
+                if len(oob_df): oob_df.to_excel(writer, sheet_name="Out_of_Bounds", index=False)
+                if len(all_ngcs): all_ngcs.to_excel(writer, sheet_name="Orphans_NGC", index=False)
             
             st.success("Analysis Complete!")
             st.download_button("📥 Download Final Excel Report", output.getvalue(), "ESA_Final_Report.xlsx")
+
+            if HAS_PYARROW:
+                # ~10x smaller than xlsx and skips spreadsheet serialization
+                # entirely for users feeding the results into another tool
+                parquet_buf = io.BytesIO()
+                pd.concat([geo_df, orphan_df], ignore_index=True).to_parquet(
+                    parquet_buf, engine='pyarrow', compression='zstd')
+                st.download_button("📥 Download Results (Parquet)",
+                                   parquet_buf.getvalue(), "ESA_Final_Report.parquet")